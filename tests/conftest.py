@@ -0,0 +1,24 @@
+import httpx
+import pytest
+
+from webextools.scim import SCIM
+
+
+@pytest.fixture
+def make_scim():
+    """Create a SCIM API object sending the requests to the mock handler."""
+    apis = []
+
+    def make(handler) -> SCIM:
+        api = SCIM(token="token", org_id="org")
+        # The client created by the session is replaced, it is closed first
+        api.session.client.close()
+        api.session.client = httpx.Client(transport=httpx.MockTransport(handler))
+        apis.append(api)
+
+        return api
+
+    yield make
+
+    for api in apis:
+        api.close()
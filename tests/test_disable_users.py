@@ -0,0 +1,141 @@
+import json
+
+import httpx
+
+from webextools.disable_users import disable_users, disable_users_bulk, find_users
+from webextools.settings import SCIM_BULK_MAX_OPERATIONS, SCIM_BULK_TIMEOUT
+from webextools.users import User
+
+
+def make_users(count: int) -> list[User]:
+    return [
+        User({"id": f"u{i}", "userName": f"user{i}@example.com", "active": True})
+        for i in range(count)
+    ]
+
+
+def bulk_handler(make_result):
+    """Mock SCIM Bulk endpoint, the results are built by make_result for each operation."""
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        operations = json.loads(request.content)["Operations"]
+
+        return httpx.Response(
+            200, json={"Operations": [make_result(operation) for operation in operations]}
+        )
+
+    return handler, requests
+
+
+def test_bulk_results_matched_by_bulk_id(make_scim):
+    handler, requests = bulk_handler(
+        lambda operation: {
+            "bulkId": operation["bulkId"],
+            "status": "404" if operation["bulkId"] == "u1" else "200",
+        }
+    )
+    api = make_scim(handler)
+
+    report = disable_users_bulk(api, make_users(3))
+
+    assert [status["updated"] for status in report] == ["Success", "Failed", "Success"]
+    assert len(requests) == 1
+    assert requests[0].url.path == "/identity/scim/org/v2/Bulk"
+    assert requests[0].extensions["timeout"]["read"] == SCIM_BULK_TIMEOUT
+
+
+def test_bulk_results_matched_by_location(make_scim):
+    handler, _ = bulk_handler(
+        lambda operation: {
+            "location": f"https://example.com/identity/scim/org/v2{operation['path']}",
+            "status": "200",
+        }
+    )
+    api = make_scim(handler)
+
+    report = disable_users_bulk(api, make_users(2))
+
+    assert [status["updated"] for status in report] == ["Success", "Success"]
+
+
+def test_bulk_missing_results_failed(make_scim):
+    api = make_scim(lambda request: httpx.Response(200, json={"Operations": []}))
+
+    report = disable_users_bulk(api, make_users(2))
+
+    assert [status["updated"] for status in report] == ["Failed", "Failed"]
+
+
+def test_bulk_not_implemented_falls_back_to_patch(make_scim):
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+
+        if request.url.path.endswith("/Bulk"):
+            return httpx.Response(501, json={"message": "Not implemented"})
+
+        user_id = request.url.path.rpartition("/")[2]
+        return httpx.Response(200, json={"id": user_id, "active": False})
+
+    api = make_scim(handler)
+
+    report = disable_users_bulk(api, make_users(2))
+
+    assert [status["updated"] for status in report] == ["Success", "Success"]
+    assert [(request.method, request.url.path) for request in requests] == [
+        ("POST", "/identity/scim/org/v2/Bulk"),
+        ("PATCH", "/identity/scim/org/v2/Users/u0"),
+        ("PATCH", "/identity/scim/org/v2/Users/u1"),
+    ]
+
+
+def test_disable_users_skips_inactive(make_scim):
+    handler, requests = bulk_handler(
+        lambda operation: {"bulkId": operation["bulkId"], "status": "200"}
+    )
+    api = make_scim(handler)
+    inactive = User({"id": "u2", "userName": "user2@example.com", "active": False})
+    users = [*make_users(1), inactive, *make_users(2)[1:]]
+
+    report = [(status["id"], status["updated"]) for status in disable_users(api, users)]
+
+    assert report == [("u0", "Success"), ("u2", "Skipped"), ("u1", "Success")]
+    assert [operation["bulkId"] for operation in json.loads(requests[0].content)["Operations"]] == [
+        "u0",
+        "u1",
+    ]
+
+
+def test_disable_users_closed_early_cancels_batches(make_scim):
+    handler, requests = bulk_handler(
+        lambda operation: {"bulkId": operation["bulkId"], "status": "200"}
+    )
+    api = make_scim(handler)
+    statuses = disable_users(api, make_users(SCIM_BULK_MAX_OPERATIONS * 40), max_workers=2)
+
+    assert next(statuses)["updated"] == "Success"
+
+    statuses.close()
+    sent = len(requests)
+
+    # Only the batches already in flight are sent
+    assert sent <= 3
+    assert len(requests) == sent
+
+
+def test_find_users_escapes_filter_values(make_scim):
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(200, json={"totalResults": 0, "Resources": []})
+
+    api = make_scim(handler)
+
+    assert find_users(api, ['a"b@example.com', "c\\d@example.com"]) == []
+    assert requests[0].url.params["filter"] == (
+        'userName eq "a\\"b@example.com" or userName eq "c\\\\d@example.com"'
+    )
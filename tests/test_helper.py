@@ -0,0 +1,35 @@
+import json
+
+import pytest
+import requests
+
+from webextools.helper import error, write_csv, write_json
+
+
+def test_write_json_closes_array_on_error(tmp_path):
+    def items():
+        yield {"id": "u0"}
+        raise RuntimeError("interrupted")
+
+    filename = str(tmp_path / "report.json")
+
+    with pytest.raises(RuntimeError):
+        write_json(items(), filename)
+
+    with open(filename, encoding="utf-8") as f:
+        assert json.load(f) == [{"id": "u0"}]
+
+
+def test_write_csv_raises_data_errors(tmp_path):
+    def rows():
+        yield {"id": "r0"}
+        raise requests.ConnectionError("connection refused")
+
+    with pytest.raises(requests.ConnectionError):
+        write_csv(rows(), str(tmp_path / "report.csv"))
+
+
+def test_error_without_response(capsys):
+    error("Failed", requests.ConnectionError("connection refused"))
+
+    assert "Error: connection refused" in capsys.readouterr().out
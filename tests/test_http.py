@@ -0,0 +1,129 @@
+import threading
+import time
+
+import httpx
+import pytest
+
+from webextools.http import Session, parse_retry_after
+
+
+@pytest.fixture
+def make_session(monkeypatch):
+    """Create a Session sending the requests to the mock handler, without backoff delays."""
+    monkeypatch.setattr(Session, "backoff", lambda self, delay, retries=0: None)
+    sessions = []
+
+    def make(handler, **params) -> Session:
+        session = Session(transport=httpx.MockTransport(handler), **params)
+        sessions.append(session)
+
+        return session
+
+    yield make
+
+    for session in sessions:
+        session.close()
+
+
+def test_service_unavailable_retried(make_session):
+    statuses = iter([503, 502, 200])
+    session = make_session(lambda request: httpx.Response(next(statuses), json={}))
+
+    assert [response.status_code for response in session.get("people")] == [200]
+
+
+def test_service_unavailable_raises_after_retries(make_session):
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(503, json={})
+
+    session = make_session(handler, max_retries=2)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        list(session.get("people"))
+
+    assert len(requests) == 3
+
+
+def test_service_unavailable_retry_after_http_date(make_session):
+    statuses = iter([503, 200])
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        headers = {"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}
+        return httpx.Response(next(statuses), json={}, headers=headers)
+
+    session = make_session(handler)
+
+    assert [response.status_code for response in session.get("people")] == [200]
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("120") == 120
+    assert parse_retry_after(None, 15) == 15
+    assert parse_retry_after("soon", 15) == 15
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
+
+
+def test_rate_limit_raises_after_retries(make_session):
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(429, json={}, headers={"Retry-After": "1"})
+
+    session = make_session(handler, max_retries=2)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        list(session.get("people"))
+
+    assert len(requests) == 3
+
+
+@pytest.fixture
+def session(monkeypatch):
+    """Create a Session with the real backoff, without the random jitter."""
+    monkeypatch.setattr(Session, "jitter", lambda self, retries=0: None)
+    session = Session()
+
+    yield session
+
+    session.close()
+
+
+def test_backoff_pauses_other_threads(session):
+    thread = threading.Thread(target=session.backoff, args=(0.3,))
+    started = time.monotonic()
+    thread.start()
+
+    while session._resume.is_set():
+        time.sleep(0.01)
+
+    session.wait_resume()
+
+    assert time.monotonic() - started >= 0.3
+    assert session._resume.is_set()
+
+    thread.join()
+
+
+def test_backoff_extended_by_longer_pause(session):
+    resumed = []
+
+    def backoff(delay: float) -> None:
+        session.backoff(delay)
+        resumed.append(time.monotonic())
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=backoff, args=(delay,)) for delay in (0.1, 0.3)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    # The shorter pause is extended, both threads resume once the longest pause has elapsed
+    assert all(at - started >= 0.3 for at in resumed)
+    assert session._resume.is_set()
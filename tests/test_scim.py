@@ -0,0 +1,77 @@
+import threading
+
+import httpx
+
+from webextools.settings import SCIM_USERS_PAGE_SIZE
+
+
+def users_page(start_index: int, items_per_page: int, total_results: int) -> dict:
+    return {
+        "startIndex": start_index,
+        "itemsPerPage": items_per_page,
+        "totalResults": total_results,
+        "Resources": [{"id": f"u{i}"} for i in range(start_index, start_index + items_per_page)],
+    }
+
+
+def test_get_users_follows_start_index(make_scim):
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        start_index = int(request.url.params["startIndex"])
+
+        return httpx.Response(200, json=users_page(start_index, min(2, 6 - start_index), 5))
+
+    api = make_scim(handler)
+
+    assert [user.id for user in api.get_users()] == ["u1", "u2", "u3", "u4", "u5"]
+    assert [request.url.params["startIndex"] for request in requests] == ["1", "3", "5"]
+    assert {request.url.params["count"] for request in requests} == {str(SCIM_USERS_PAGE_SIZE)}
+
+
+def test_get_users_keeps_filter(make_scim):
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(200, json=users_page(1, 1, 1))
+
+    api = make_scim(handler)
+
+    assert [user.id for user in api.get_users(filter='userName eq "a@example.com"')] == ["u1"]
+    assert requests[0].url.params["filter"] == 'userName eq "a@example.com"'
+
+
+def test_get_users_single_page_fetched_inline(make_scim):
+    threads = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        threads.append(threading.current_thread())
+        return httpx.Response(200, json=users_page(1, 1, 1))
+
+    api = make_scim(handler)
+
+    assert [user.id for user in api.get_users()] == ["u1"]
+    assert threads == [threading.main_thread()]
+
+
+def test_get_users_empty_page(make_scim):
+    api = make_scim(lambda request: httpx.Response(200, json=users_page(1, 0, 0)))
+
+    assert list(api.get_users()) == []
+
+
+def test_get_users_page_ignores_link_header(make_scim):
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        headers = {"Link": '<https://example.com/next>; rel="next"'}
+
+        return httpx.Response(200, json=users_page(1, 1, 1), headers=headers)
+
+    api = make_scim(handler)
+
+    assert [user.id for user in api.get_users()] == ["u1"]
+    assert len(requests) == 1
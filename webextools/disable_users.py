@@ -1,109 +1,273 @@
 """This is module to disable Webex Teams users from the CSV file."""
 
 import argparse
-import json
+import itertools
 import os
+import re
 import shutil
 import sys
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-
-from webextools.helper import error, get_org_id_from_token, prompt_token, read_csv, verbose
+from functools import partial
+from http import HTTPStatus
+from typing import Iterator
+
+import httpx
+
+from webextools.helper import (
+    LazyFormat,
+    debug,
+    error,
+    get_org_id_from_token,
+    prompt_token,
+    read_csv_column,
+    set_verbosity,
+    verbose,
+    write_json,
+)
 from webextools.scim import SCIM
+from webextools.settings import DEFAULT_MAX_WORKERS, SCIM_BULK_MAX_OPERATIONS, SCIM_FILTER_BATCH_SIZE
 from webextools.users import User
 
 terminal_width = shutil.get_terminal_size().columns
 
+SUCCESS = "\033[92m[Success]\033[0m"
+FAILED = "\033[91m[Failed]\033[0m"
+SKIPPED = "\033[93m[Skipped]\033[0m"
+ACTIVE = "\033[92m\u2713\033[0m"
+INACTIVE = "\033[91m\u2717\033[0m"
+
+EMAIL_REGEX = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+DISABLE_USER_PATCH = {
+    "schemas": ["urn:ietf:params:scim:api:messages:2.0:PatchOp"],
+    "Operations": [{"op": "replace", "value": {"active": False}}],
+}
 
-def disable_users(api: SCIM, users: list[User]) -> list[dict]:
+
+def disable_user(api: SCIM, user: User) -> dict:
     """
-    Disable the users in the Webex Teams.
+    Disable the user in the Webex Teams.
+
+    :param api: SCIM API object
+    :param user: User object
+
+    :return: user status
+    """
+    status = {"id": user.id, "email": user.user_name, "updated": ""}
+
+    if not user.active:
+        verbose("%s User is already disabled: %s (%s)", SKIPPED, user.display_name, user.user_name)
+        status["updated"] = "Skipped"
+        return status
+
+    try:
+        response = api.update_user_patch(user.id, DISABLE_USER_PATCH)
+        if not isinstance(response, User) or response.active:
+            verbose("%s Unable to disable user: %s (%s)", FAILED, user.display_name, user.user_name)
+            status["updated"] = "Failed"
+        else:
+            verbose("%s Disabling user: %s (%s)", SUCCESS, user.display_name, user.user_name)
+            status["updated"] = "Success"
+    except Exception as e:
+        verbose("%s Unable to disable user: %s (%s)", FAILED, user.display_name, user.user_name)
+        error("Internal error occurred", e)
+
+        status["updated"] = "Failed"
+
+    return status
+
+
+def disable_users_bulk(api: SCIM, users: list[User]) -> list[dict]:
+    """
+    Disable the users in the Webex Teams with a single SCIM Bulk request.
+
+    Falls back to disabling the users one by one if the Bulk endpoint is not implemented.
 
     :param api: SCIM API object
-    :param people: list of Person objects
+    :param users: list of active User objects, at most SCIM_BULK_MAX_OPERATIONS
 
     :return: list of user status
     """
+    try:
+        results = api.bulk_request(
+            [
+                {
+                    "method": "PATCH",
+                    "path": f"/Users/{user.id}",
+                    "bulkId": user.id,
+                    "data": DISABLE_USER_PATCH,
+                }
+                for user in users
+            ]
+        )
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == HTTPStatus.NOT_IMPLEMENTED:
+            return [disable_user(api, user) for user in users]
+
+        error("Internal error occurred", e)
+        results = []
+    except Exception as e:
+        error("Internal error occurred", e)
+        results = []
+
+    by_id = {}
+
+    # Results are matched by the echoed bulkId, or by the user ID of the result location
+    for result in results:
+        location = result.get("location") or ""
+
+        if "/Users/" in location:
+            by_id[location.rstrip("/").rpartition("/Users/")[2]] = result
+
+        if result.get("bulkId"):
+            by_id[result["bulkId"]] = result
+
     report = []
 
     for user in users:
         status = {"id": user.id, "email": user.user_name, "updated": ""}
 
-        if not user.active:
-            verbose(
-                f"\033[93m[Skipped]\033[0m User is already disabled: {user.display_name} ({user.user_name})"
-            )
-            status["updated"] = "Skipped"
-            report.append(status)
-            continue
-
-        try:
-            response = api.update_user_patch(
-                user.id,
-                {
-                    "schemas": ["urn:ietf:params:scim:api:messages:2.0:PatchOp"],
-                    "Operations": [{"op": "replace", "value": {"active": False}}],
-                },
-            )
-            if not isinstance(response, User) or response.active:
-                verbose(
-                    f"\033[91m[Failed]\033[0m Unable to disable user: {user.display_name} ({user.user_name})"
-                )
-                status["updated"] = "Failed"
-            else:
-                verbose(
-                    f"\033[92m[Success]\033[0m Disabling user: {user.display_name} ({user.user_name})"
-                )
-                status["updated"] = "Success"
-            report.append(status)
-        except Exception as e:
-            verbose(
-                f"\033[91m[Failed]\033[0m Unable to disable user: {user.display_name} ({user.user_name})"
-            )
-            error("Internal error occurred", e)
-
+        if str(by_id.get(user.id, {}).get("status", "")).startswith("2"):
+            verbose("%s Disabling user: %s (%s)", SUCCESS, user.display_name, user.user_name)
+            status["updated"] = "Success"
+        else:
+            verbose("%s Unable to disable user: %s (%s)", FAILED, user.display_name, user.user_name)
             status["updated"] = "Failed"
-            report.append(status)
+
+        report.append(status)
 
     return report
 
 
-def get_user(api: SCIM, email: str) -> User:
+def disable_users(
+    api: SCIM, users: list[User], max_workers: int = DEFAULT_MAX_WORKERS
+) -> Iterator[dict]:
     """
-    Get the user from the Webex SCIM API.
+    Disable the users in the Webex Teams.
+
+    Active users are disabled in SCIM Bulk requests of SCIM_BULK_MAX_OPERATIONS users,
+    at most `max_workers` requests are in flight at once. User status is yielded in the order
+    of the users, as soon as the request of its batch completes. If the iterator is closed
+    early, the batches which have not been sent yet are cancelled.
+
+    :param api: SCIM API object
+    :param users: list of User objects
+    :param max_workers: maximum number of concurrent requests
+
+    :return: iterator of user status
+    """
+    active_users = [user for user in users if user.active]
+    batches = [
+        active_users[i : i + SCIM_BULK_MAX_OPERATIONS]
+        for i in range(0, len(active_users), SCIM_BULK_MAX_OPERATIONS)
+    ]
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    try:
+        futures = [executor.submit(disable_users_bulk, api, batch) for batch in batches]
+        # Each batch is waited for once its first user is reached
+        statuses = itertools.chain.from_iterable(future.result() for future in futures)
+
+        for user in users:
+            # Already disabled users are reported as skipped, no request is made
+            yield next(statuses) if user.active else disable_user(api, user)
+    finally:
+        # Batches not started yet are not sent if the caller stops consuming the statuses
+        executor.shutdown(cancel_futures=True)
+
+
+def quote_filter_value(value: str) -> str:
+    """
+    Quote the value as a SCIM filter string, backslashes and double quotes are escaped.
+
+    :param value: attribute value
+    :return: quoted attribute value
+    """
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def find_users(api: SCIM, emails: list[str]) -> list[User]:
+    """
+    Find the users with the given emails in the Webex SCIM API.
 
     :param api: SCIM API object
     :param emails: list of user emails
 
     :return: list of User objects
     """
+    query = " or ".join(f"userName eq {quote_filter_value(email)}" for email in emails)
+
     try:
-        return api.get_users(filter=f'userName eq "{email}"')
+        return list(api.get_users(filter=query))
     except Exception as err:
-        error(f"Failed to get user with email {email}", err)
+        error(f"Failed to get users with emails {', '.join(emails)}", err)
         sys.exit(1)
 
 
+def get_users(
+    api: SCIM, emails: list[str], max_workers: int = DEFAULT_MAX_WORKERS
+) -> dict[str, User]:
+    """
+    Get the users from the Webex SCIM API.
+
+    Emails are looked up in batches of SCIM_FILTER_BATCH_SIZE, concurrently.
+
+    :param api: SCIM API object
+    :param emails: list of user emails
+    :param max_workers: maximum number of concurrent requests
+
+    :return: dictionary of User objects by email, emails not found in organization are omitted
+    """
+    users = {}
+    batches = [
+        emails[i : i + SCIM_FILTER_BATCH_SIZE] for i in range(0, len(emails), SCIM_FILTER_BATCH_SIZE)
+    ]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for batch, found in zip(batches, executor.map(partial(find_users, api), batches)):
+            by_name = {user.user_name.lower(): user for user in found}
+            users.update(
+                {email: by_name[email.lower()] for email in batch if email.lower() in by_name}
+            )
+
+    return users
+
+
 def get_emails_from_csv(args: argparse.Namespace) -> list[str]:
     """
     Get the user emails from the CSV file.
 
     :param args: argparse.Namespace object
-    :return: list of user emails
+    :return: list of unique user emails, compared case-insensitively
     """
     emails = []
+    invalid = []
+    seen = set()
 
     email = args.column
-    users = read_csv(args.file, email)
 
-    for user in users:
-        if not user.get(email, ""):
+    for value in read_csv_column(args.file, email):
+        value = value.strip()
+
+        if not value:
             continue
 
-        if "@" not in user[email]:
-            verbose(f"Invalid email address: {user[email]}")
+        if value.lower() in seen:
             continue
 
-        emails.append(user[email])
+        seen.add(value.lower())
+
+        if EMAIL_REGEX.match(value):
+            emails.append(value)
+        else:
+            invalid.append(value)
+
+    if invalid:
+        verbose("Skipped %d invalid email address(es)", len(invalid))
+        debug("Invalid email addresses: %s", LazyFormat(", ".join, invalid))
 
     if not emails:
         error(f"No users found in the column '{email}' of the CSV file.")
@@ -121,29 +285,39 @@ def disable_users_main(args: argparse.Namespace) -> None:
     token = prompt_token()
     org_id = get_org_id_from_token(token)
 
-    api = SCIM(token=token, org_id=org_id)
+    with SCIM(token=token, org_id=org_id) as api:
+        emails = get_emails_from_csv(args)
+        found = get_users(api, emails)
 
-    emails = get_emails_from_csv(args)
-    # users = get_users(api, emails)
-    users = [next(get_user(api, email)) for email in emails]
+        for email in emails:
+            if email not in found:
+                verbose("User not found in organization: %s", email)
 
-    if not users:
-        error("No users, from CSV file, found in organization")
-        sys.exit(1)
+        users = list(found.values())
 
-    if args.dry_run:
-        dry_run(users)
+        if not users:
+            error("No users, from CSV file, found in organization")
+            sys.exit(1)
 
-    disabled_users = disable_users(api, users)
+        if args.dry_run:
+            dry_run(users)
 
-    if args.report:
-        current_datetime = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"disabled_users_report.{current_datetime}.json"
+        disabled_users = disable_users(api, users)
 
-        with open(filename, "w") as f:
-            json.dump(disabled_users, f, indent=4)
+        if args.report:
+            current_datetime = datetime.now().strftime("%Y%m%d_%H%M%S")
+            filename = write_json(disabled_users, f"disabled_users_report.{current_datetime}.json")
 
-        print(f"\nReport written to {os.path.abspath(filename)}\n")
+            print(f"\nReport written to {os.path.abspath(filename)}\n")
+        else:
+            summary = Counter(status["updated"] for status in disabled_users)
+
+            verbose(
+                "Disabled %d user(s), failed %d, skipped %d",
+                summary["Success"],
+                summary["Failed"],
+                summary["Skipped"],
+            )
 
 
 def dry_run(users: list[User]) -> None:
@@ -160,20 +334,23 @@ def dry_run(users: list[User]) -> None:
                 "name": user.display_name,
                 "email": user.user_name,
                 "id": user.id,
-                "active": "\033[92m\u2713\033[0m" if user.active else "\033[91m\u2717\033[0m",
+                "active": ACTIVE if user.active else INACTIVE,
             }
             for user in users
         ]
 
-        print("-" * 124)
-        print("| {:^30} | {:^30} | {:^40} | {:^12}|".format("Username", "Email", "ID", "Active"))
-        print("-" * 124)
+        separator = "-" * 124
+        lines = [
+            separator,
+            "| {:^30} | {:^30} | {:^40} | {:^12}|".format("Username", "Email", "ID", "Active"),
+            separator,
+        ]
 
         for row in data:
-            print(
+            lines.append(
                 f"| {row['name']: <30} | {row['email']: <30} | {row['id']: ^40} | {row['active']: ^20} |"
             )
-            print("-" * 124)
+            lines.append(separator)
     else:
         data = [
             {
@@ -181,24 +358,33 @@ def dry_run(users: list[User]) -> None:
                 if len(user.display_name) < 28
                 else user.display_name[:25] + "...",
                 "email": user.user_name if len(user.user_name) < 28 else user.user_name[:25] + "...",
-                "active": "\033[92m\u2713\033[0m" if user.active else "\033[91m\u2717\033[0m",
+                "active": ACTIVE if user.active else INACTIVE,
             }
             for user in users
         ]
 
-        print("-" * 78)
-        print("| {:^28} | {:^28} | {:^12} |".format("Username", "Email", "Active"))
-        print("-" * 78)
+        separator = "-" * 78
+        lines = [
+            separator,
+            "| {:^28} | {:^28} | {:^12} |".format("Username", "Email", "Active"),
+            separator,
+        ]
 
         for row in data:
-            print(f"| {row['name']: <28} | {row['email']: <28} | {row['active']: ^22} |")
-            print("-" * 78)
+            lines.append(f"| {row['name']: <28} | {row['email']: <28} | {row['active']: ^22} |")
+            lines.append(separator)
+
+    print("\n".join(lines))
 
     exit(0)
 
 
-def parse_args():
-    parser = argparse.ArgumentParser(description="Disable Webex Teams users.")
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Add the disable users arguments to the parser.
+
+    :param parser: argparse.ArgumentParser object
+    """
     parser.add_argument("--file", "-f", help="CSV file with users data", required=True)
     parser.add_argument("--column", "-c", help="Column name to use for user email", default="email")
     parser.add_argument(
@@ -210,19 +396,21 @@ def parse_args():
 
     parser.add_argument(
         "-v",
-        "--version",
+        "--verbose",
         action="count",
         default=0,
         help="Verbose output (can be specified multiple times)",
     )
-    args = parser.parse_args()
 
-    if args.verbose == 1:
-        os.environ["VERBOSE"] = "1"
+    parser.add_argument("--dry-run", "-d", action="store_true", help="Dry run mode")
 
-    if args.verbose > 1:
-        os.environ["VERBOSE"] = "1"
-        os.environ["DEBUG"] = "1"
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Disable Webex Teams users.")
+    add_arguments(parser)
+
+    args = parser.parse_args()
+    set_verbosity(args.verbose)
 
     return args
 
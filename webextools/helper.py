@@ -1,35 +1,112 @@
+import contextlib
 import csv
+import functools
 import getpass
+import itertools
 import json
 import os
+import re
 import sys
-import uuid
+import textwrap
 from datetime import datetime, timedelta
-from typing import Any, Optional
+from operator import itemgetter
+from typing import Any, Callable, Iterable, Iterator, Optional, Union
 
 from webextools.settings import DEFAULT_BASE_URL, RESOURCE_URIS
 
+RESOURCE_URLS = {name: f"{DEFAULT_BASE_URL}/{uri}" for name, uri in RESOURCE_URIS.items()}
 
-def verbose(message: Any) -> None:
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+UUID_REGEX = re.compile(
+    r"\A[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\Z"
+)
+
+_VERBOSE = os.getenv("VERBOSE") is not None
+_DEBUG = os.getenv("DEBUG") is not None
+_TOKEN = None
+
+
+class LazyFormat:
+    """Log message argument formatted only when the message is printed."""
+
+    __slots__ = ("func", "args")
+
+    def __init__(self, func: Callable[..., str], *args):
+        """
+        Initialize the LazyFormat object.
+
+        :param func: function returning the formatted argument
+        :param args: arguments to pass to the function
+        """
+        self.func = func
+        self.args = args
+
+    def __str__(self) -> str:
+        return self.func(*self.args)
+
+
+def verbose(message: Any, *args) -> None:
     """
-    Log the message to the console if the VERBOSE environment variable is set.
+    Log the message to the console if the verbose output is enabled.
 
-    :param message: message to log
+    :param message: message to log, formatted with `message % args` if args are provided
+    :param args: message arguments, formatted only if the message is logged
     """
-    if os.getenv("VERBOSE") is None:
+    if not _VERBOSE:
         return
 
-    print(f"[\033[96mVERBOSE\033[0m] {message}")
+    print(f"[\033[96mVERBOSE\033[0m] {message % args if args else message}")
+
 
+def debug(message: str, *args) -> None:
+    """
+    Log the message to the console if the debug output is enabled.
+
+    :param message: message to log, formatted with `message % args` if args are provided
+    :param args: message arguments, formatted only if the message is logged
+    """
+    if _DEBUG:
+        print(f"[\033[94mDEBUG\033[0m] {message % args if args else message}")
+
+
+def is_verbose() -> bool:
+    """
+    Check if the verbose output is enabled, either by VERBOSE environment variable or verbosity level.
 
-def debug(message: str) -> None:
+    :return: True if the verbose output is enabled
     """
-    Log the message to the console if the DEBUG environment variable is set.
+    return _VERBOSE
 
-    :param message: message to log
+
+def is_debug() -> bool:
+    """
+    Check if the debug output is enabled, either by DEBUG environment variable or verbosity level.
+
+    :return: True if the debug output is enabled
     """
-    if os.getenv("DEBUG") is not None:
-        print(f"[\033[94mDEBUG\033[0m] {message}")
+    return _DEBUG
+
+
+def set_verbosity(level: int) -> None:
+    """
+    Enable the verbose output for the verbosity level 1 and the debug output for level 2 and above.
+
+    :param level: verbosity level, number of times the verbose option was specified
+    """
+    global _VERBOSE, _DEBUG
+
+    if level > 0:
+        os.environ["VERBOSE"] = "1"
+        _VERBOSE = True
+
+    if level > 1:
+        os.environ["DEBUG"] = "1"
+        _DEBUG = True
 
 
 def error(message: str, exc: Optional[Exception] = None) -> None:
@@ -44,28 +121,61 @@ def error(message: str, exc: Optional[Exception] = None) -> None:
     if not isinstance(exc, Exception):
         return
 
-    if hasattr(exc, "response"):
+    # requests exceptions raised before a response was received have response=None
+    if getattr(exc, "response", None) is not None:
         status_code = exc.response.status_code
         reason_phrase = exc.response.reason_phrase
 
-        text = json.loads(exc.response.text)
+        try:
+            text = json_loads(exc.response.content)
+        except ValueError:
+            text = None
+
+        if not isinstance(text, dict):
+            text = {}
 
         message = text.get("message", "")
-        tracking_id = text.get("trackingId", "")
 
         if message:
             err_message = f"\nError: {status_code} ({reason_phrase}) - {message}\n"
         else:
             err_message = f"\nError: {status_code} ({reason_phrase})\n"
 
-        if os.getenv("DEBUG") is not None:
-            err_message += f"Tracking ID: {tracking_id}"
+        if _DEBUG:
+            err_message += f"Tracking ID: {text.get('trackingId', '')}"
     else:
         err_message = f"\nError: {str(exc)}\n"
 
     print(err_message, "\n")
 
 
+def json_loads(data: Union[str, bytes]) -> Any:
+    """
+    Deserialize the JSON document, orjson is used if installed.
+
+    :param data: JSON document
+    :return: deserialized object
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+
+    return json.loads(data)
+
+
+def json_dumps(obj: Any, indent: bool = False) -> str:
+    """
+    Serialize the object to JSON string, orjson is used if installed.
+
+    :param obj: object to serialize
+    :param indent: pretty-print with 2 spaces indentation
+    :return: JSON string
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0).decode()
+
+    return json.dumps(obj, indent=2 if indent else None, ensure_ascii=False)
+
+
 def get_url(resource: str, *params):
     """
     Get URL for the specified resource.
@@ -73,24 +183,44 @@ def get_url(resource: str, *params):
     :param params: request parameters.
     :return: URL.
     """
-    uri = RESOURCE_URIS.get(resource)
+    prefix = RESOURCE_URLS.get(resource)
 
-    if uri is None:
+    if prefix is None:
         return
 
     if params:
-        return DEFAULT_BASE_URL + "/" + RESOURCE_URIS[resource] + "/" + "/".join(params)
+        return prefix + "/" + "/".join(params)
 
-    return DEFAULT_BASE_URL + "/" + RESOURCE_URIS[resource]
+    return prefix
 
 
-def read_csv(filename: str, columns: Optional[list]) -> list:
+def tuple_getter(items: list) -> Callable[[Any], tuple]:
     """
-    Read CSV file and return the data as a list of dictionaries.
+    Get the function to extract the items of a row as a tuple.
+
+    `itemgetter` returns the bare value for a single item, and can't be created with no items,
+    both cases are wrapped to return a tuple too.
+
+    :param items: list of keys to extract
+    :return: function returning the tuple of the row items
+    """
+    if len(items) > 1:
+        return itemgetter(*items)
+
+    if items:
+        getter = itemgetter(items[0])
+        return lambda row: (getter(row),)
+
+    return lambda row: ()
+
+
+def read_csv(filename: str, columns: Optional[list]) -> Iterator[dict]:
+    """
+    Read CSV file and yield the data row by row.
 
     :param filename: file name or filepath
     :param columns: list of columns to include in the result
-    :return: list of dictionaries for each row in the CSV file
+    :return: iterator of dictionaries for each row in the CSV file
     """
 
     if isinstance(columns, str):
@@ -99,56 +229,152 @@ def read_csv(filename: str, columns: Optional[list]) -> list:
     if not isinstance(columns, list):
         columns = []
 
+    wanted = set(columns)
+
     with open(filename, "r", encoding="utf-8-sig") as f:
-        data = list(csv.DictReader(f))
+        reader = csv.reader(f)
+        header = next(reader, None)
+
+        if header is None:
+            return
+
+        if wanted:
+            keep = [(i, name.strip()) for i, name in enumerate(header) if name.strip() in wanted]
+        else:
+            keep = list(enumerate(header))
 
-    if not columns:
-        return data
+        width = len(header)
 
-    return [{k.strip(): v for k, v in row.items() if k.strip() in columns} for row in data]
+        for row in reader:
+            if not row:
+                continue
 
+            if len(row) < width:
+                row += [None] * (width - len(row))
 
-def write_csv(data: list[dict], csv_filename) -> str:
+            yield {name: row[i] for i, name in keep}
+
+
+def read_csv_column(filename: str, column: str) -> Iterator[str]:
+    """
+    Read CSV file and yield the values of a single column row by row.
+
+    :param filename: file name or filepath
+    :param column: column name
+    :return: iterator of the column values, rows without the column value are skipped
     """
-    Write data to a CSV file.
+    with open(filename, "r", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
 
-    :param data: list of dictionaries.
+        if header is None:
+            return
+
+        index = next((i for i, name in enumerate(header) if name.strip() == column), None)
+
+        if index is None:
+            return
+
+        for row in reader:
+            if len(row) > index:
+                yield row[index]
+
+
+def write_csv(data: Iterable[dict], csv_filename) -> str:
+    """
+    Write data to a CSV file, rows are written as soon as they are produced.
+
+    :param data: iterable of dictionaries, the header is taken from the first one.
     :param csv_filename: CSV file name or filepath.
 
-    :return: CSV file name or empty string if an error occurred.
+    :return: CSV file name or empty string if the file could not be written.
+    :raises: errors raised while producing the data
     """
-    keys = data[0].keys() if data else []
+    rows = iter(data)
+    first = next(rows, None)
+
+    keys = list(first.keys()) if first else []
+    key_set = set(keys)
+    defaults = dict.fromkeys(keys, "")
+
+    getter = tuple_getter(keys)
 
     if not csv_filename.endswith(".csv"):
         csv_filename += ".csv"
 
     try:
-        with open(csv_filename, "w", newline="", encoding="utf-8") as csv_file:
-            writer = csv.DictWriter(csv_file, fieldnames=keys)
-
-            writer.writeheader()
-            writer.writerows(data)
-    except Exception as e:
+        csv_file = open(csv_filename, "w", newline="", encoding="utf-8", buffering=1 << 20)
+    except OSError as e:
         error("Error writing to CSV file:", e)
         return ""
 
+    with csv_file:
+        writer = csv.writer(csv_file)
+        lines = itertools.chain(
+            (keys,),
+            # Rows missing some of the header keys are filled with empty strings
+            (
+                getter(row if key_set <= row.keys() else {**defaults, **row})
+                for row in itertools.chain((first,) if first else (), rows)
+            ),
+        )
+
+        # Errors raised while producing the rows are propagated, only write errors are reported
+        for line in lines:
+            try:
+                writer.writerow(line)
+            except (OSError, csv.Error) as e:
+                error("Error writing to CSV file:", e)
+                return ""
+
     return csv_filename
 
 
+def write_json(data: Iterable[dict], json_filename: str) -> str:
+    """
+    Write data to a JSON file as an array, items are written as soon as they are produced.
+
+    The array is closed even if producing the data fails, so the items written so far are
+    still a valid JSON file.
+
+    :param data: iterable of dictionaries.
+    :param json_filename: JSON file name or filepath.
+
+    :return: JSON file name.
+    """
+    if not json_filename.endswith(".json"):
+        json_filename += ".json"
+
+    with open(json_filename, "w", encoding="utf-8") as json_file:
+        json_file.write("[")
+        separator = "\n"
+
+        try:
+            for item in data:
+                json_file.write(separator + textwrap.indent(json_dumps(item, indent=True), "  "))
+                separator = ",\n"
+        finally:
+            json_file.write("]" if separator == "\n" else "\n]")
+
+    return json_filename
+
+
 def remove_file(filename: str) -> None:
     """
     Check if the result file exists, if so, remove it.
 
     :param filename: file name or filepath.
     """
-    if os.path.exists(filename):
+    with contextlib.suppress(FileNotFoundError):
         os.remove(filename)
 
 
 def file_exists(filename: str) -> bool:
     """
-    Check if the result file exists, if so, remove it.
+    Check if the result file exists.
+
     :param filename: file name or filepath.
+    :return: True if the file exists.
     """
     return os.path.isfile(filename)
 
@@ -167,44 +393,45 @@ def generate_time_ranges(total_days: int = 0, span: int = 0) -> list:
     if total_days < span:
         span = total_days
 
-    current_time = datetime.now()
+    current_time = datetime.now().replace(microsecond=0)
+    current_date = (current_time - timedelta(seconds=1)).date()
     time_ranges = []
 
     for i in range(0, total_days, span):
-        if i + span > total_days:
-            span = total_days - i
-        start_date = (
-            (current_time - timedelta(days=i + span, seconds=1))
-            .replace(hour=23, minute=59, second=59)
-            .strftime("%Y-%m-%dT%H:%M:%S")
-        )
-        end_date = (current_time - timedelta(days=i)).strftime("%Y-%m-%dT%H:%M:%S")
-        time_ranges.append((start_date, end_date))
+        range_span = min(span, total_days - i)
+
+        start_date = current_date - timedelta(days=i + range_span)
+        end_date = current_time - timedelta(days=i)
+
+        time_ranges.append((f"{start_date.isoformat()}T23:59:59", end_date.isoformat()))
 
     return time_ranges
 
 
 def prompt_token() -> str:
     """
-    Prompt the Webex API access token.
+    Prompt the Webex API access token, the token is prompted only once per process.
 
     :return: Webex API access token
     """
-    token = os.environ.get("WEBEX_TEAMS_ACCESS_TOKEN")
+    global _TOKEN
 
-    if token is not None:
-        return token
+    if _TOKEN is not None:
+        return _TOKEN
 
-    print()
-    token = getpass.getpass(" Enter your Webex API access token: ")
-    print()
+    token = os.environ.get("WEBEX_TEAMS_ACCESS_TOKEN")
+
+    while token is None:
+        print()
+        token = getpass.getpass(" Enter your Webex API access token: ").strip() or None
+        print()
 
-    if not token.strip():
-        print("Invalid token provided, token cannot be empty.")
+        if token is None:
+            print("Invalid token provided, token cannot be empty.")
 
-        prompt_token()
+    _TOKEN = token
 
-    return token.strip()
+    return token
 
 
 def prompt_proxy_credentials() -> tuple[str, str]:
@@ -223,19 +450,19 @@ def prompt_proxy_credentials() -> tuple[str, str]:
     if username:
         return username, getpass.getpass(" Enter proxy server password: ")
 
-    print()
-    username = input(" Enter proxy server username: ")
-    password = getpass.getpass(" Enter proxy server password: ")
-    print()
+    while True:
+        print()
+        username = input(" Enter proxy server username: ").strip()
+        password = getpass.getpass(" Enter proxy server password: ")
+        print()
 
-    if not username.strip():
-        print("Invalid username provided, username cannot be empty.")
+        if username:
+            return username, password
 
-        prompt_proxy_credentials()
-
-    return username.strip(), password
+        print("Invalid username provided, username cannot be empty.")
 
 
+@functools.lru_cache(maxsize=8)
 def get_org_id_from_token(token: str) -> str:
     """
     Get the organization ID from the Webex API access token.
@@ -249,10 +476,9 @@ def get_org_id_from_token(token: str) -> str:
         print("Invalid Webex API access token.")
         sys.exit(1)
 
-    parts = token.split("_")
-    org_id = parts[-1]
+    org_id = token.rpartition("_")[2]
 
-    if not uuid.UUID(org_id):
+    if not UUID_REGEX.match(org_id):
         print("Invalid organization ID.")
         sys.exit(1)
 
@@ -1,19 +1,75 @@
-import json
+import base64
+import math
+import random
+import re
+import threading
 import time
+from email.utils import parsedate_to_datetime
 from http import HTTPStatus
-from urllib.parse import urlparse
+from typing import Optional
 
 import httpx
 
-from webextools.helper import debug, prompt_proxy_credentials, verbose
-from webextools.settings import DEFAULT_BASE_URL
+from webextools.helper import (
+    LazyFormat,
+    debug,
+    is_verbose,
+    json_dumps,
+    prompt_proxy_credentials,
+    verbose,
+)
+from webextools.settings import DEFAULT_BASE_URL, DEFAULT_MAX_WORKERS
+
+NEXT_LINK_REGEX = re.compile(r'<([^>]+)>\s*;[^,]*\brel="?next"?')
+
+
+def parse_retry_after(value: Optional[str], default: int = 0) -> int:
+    """
+    Parse the Retry-After header, given either in seconds or as an HTTP date.
+
+    :param value: Retry-After header value
+    :param default: number of seconds returned if the header is missing or invalid
+    :return: number of seconds to wait
+    """
+    if not value:
+        return default
+
+    if value.strip().isdigit():
+        return int(value)
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+
+    return max(0, math.ceil(retry_at.timestamp() - time.time()))
+
+
+def dump_headers(headers: httpx.Headers) -> str:
+    """
+    Dump the HTTP headers to a JSON string.
+
+    :param headers: HTTP headers
+    :return: indented JSON string
+    """
+    return json_dumps(dict(headers), indent=True)
 
 
 class RateLimit(Exception):
     """API rate limit exceeded."""
 
-    def __init__(self, url: str, retry_after: int):
-        self.url = url
+    def __init__(self, response: httpx.Response, retry_after: int):
+        self.response = response
+        self.url = response.url
+        self.retry_after = retry_after
+
+
+class ServiceUnavailable(Exception):
+    """API service is temporarily unavailable."""
+
+    def __init__(self, response: httpx.Response, retry_after: int):
+        self.response = response
+        self.url = response.url
         self.retry_after = retry_after
 
 
@@ -38,15 +94,40 @@ class Session:
         :param params: additional parameters to pass to the HTTPx client
         """
         self.base_url = base_url
+        self.base_prefix = base_url.rstrip("/") + "/"
         self.max_retries = max_retries
         self.params = params if params else {}
 
         if "timeout" not in self.params:
             self.params["timeout"] = 10
 
+        if "limits" not in self.params:
+            self.params["limits"] = httpx.Limits(
+                max_keepalive_connections=DEFAULT_MAX_WORKERS, keepalive_expiry=60
+            )
+
         if authorization:
             self.params["headers"] = {"Authorization": authorization}
 
+        self.client = httpx.Client(**self.params)
+
+        # Requests are paused for all threads sharing the session while it is rate limited
+        self._resume = threading.Event()
+        self._resume.set()
+        self._resume_at = 0.0
+        self._lock = threading.Lock()
+        self._proxy_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self) -> None:
+        """Close the HTTP client and its connections."""
+        self.client.close()
+
     def get(self, url: str, **kwargs):
         """
         Make a GET request.
@@ -106,62 +187,142 @@ class Session:
         """
         retries = 0
 
-        with httpx.Client(**self.params) as client:
-            while retries <= self.max_retries and url:
-                try:
-                    response = client.request(method, self.normalize_url(url), **params)
-                    debug(f"Request URL: {response.request.url}")
-                    verbose(f"Request: {response.request.method} {response.request.url}")
-                    verbose(
-                        f"Request headers: {json.dumps(dict(response.request.headers), indent=2)}"
-                    )
+        while retries <= self.max_retries and url:
+            try:
+                self.wait_resume(retries)
+                proxy_authorization = self.client.headers.get("Proxy-Authorization")
+                response = self.client.request(method, self.normalize_url(url), **params)
+                debug("Request URL: %s", response.request.url)
 
+                verbose("Request: %s %s", response.request.method, response.request.url)
+                verbose("Request headers: %s", LazyFormat(dump_headers, response.request.headers))
+
+                if is_verbose():
                     print()
 
-                    verbose(f"Response: {response.status_code}")
-                    verbose(f"Response headers: {json.dumps(dict(response.headers), indent=2)}")
+                verbose("Response: %s", response.status_code)
+                verbose("Response headers: %s", LazyFormat(dump_headers, response.headers))
 
-                    self.process_response(response)
+                self.process_response(response)
 
-                    yield response
+                yield response
 
-                    if link_header := response.headers.get("Link"):
-                        links = httpx._utils.parse_header_links(link_header)
+                # Only GET requests follow the next page link, the loop ends on the last page
+                link = None
 
-                        for link in links:
-                            if link["rel"] == "next":
-                                url = link["url"]
-                                continue
+                if method == "GET":
+                    link = NEXT_LINK_REGEX.search(response.headers.get("Link", ""))
 
-                    url = None
+                url = link.group(1) if link else None
 
-                except RateLimit as err:
-                    verbose(
-                        (
-                            "Received 429 Too Many Requests. ",
-                            f"Retrying after {err.retry_after} seconds... ",
-                            f"(Attempt {retries + 1}/{self.max_retries + 1})",
-                        )
-                    )
+                # The next page link already carries the query parameters
+                params.pop("params", None)
 
-                    time.sleep(err.retry_after)
-                    retries = retries + 1
-                except ProxyAuthenticationRequired:
-                    username, password = prompt_proxy_credentials()
-                    self.params["headers"]["Proxy-Authorization"] = httpx.BasicAuth(
-                        username, password
-                    )
-                    retries = retries + 1
-                except httpx.RequestError as err:
+            except RateLimit as err:
+                if retries >= self.max_retries:
                     debug(
-                        f"An error occurred while requesting URL: {err.request.url}, error: {err}",
+                        "An error occurred while requesting URL: %s, error: %s",
+                        err.url,
+                        err.response.status_code,
                     )
-                    raise err
-                except httpx.HTTPStatusError as err:
+                    err.response.raise_for_status()
+
+                verbose(
+                    "Received 429 Too Many Requests. Retrying after %d seconds... (Attempt %d/%d)",
+                    err.retry_after,
+                    retries + 1,
+                    self.max_retries + 1,
+                )
+
+                self.backoff(err.retry_after, retries)
+                retries = retries + 1
+            except ServiceUnavailable as err:
+                if retries >= self.max_retries:
                     debug(
-                        f"An error occurred while requesting URL: {err.request.url}, error: {err.response.status_code}",
+                        "An error occurred while requesting URL: %s, error: %s",
+                        err.url,
+                        err.response.status_code,
                     )
-                    raise err
+                    err.response.raise_for_status()
+
+                retry_after = err.retry_after or 2**retries
+
+                verbose(
+                    "Service unavailable: %s. Retrying after %d seconds... (Attempt %d/%d)",
+                    err.url,
+                    retry_after,
+                    retries + 1,
+                    self.max_retries + 1,
+                )
+
+                self.backoff(retry_after, retries)
+                retries = retries + 1
+            except ProxyAuthenticationRequired:
+                # Credentials are prompted once, threads rejected meanwhile retry with them
+                with self._proxy_lock:
+                    if self.client.headers.get("Proxy-Authorization") == proxy_authorization:
+                        username, password = prompt_proxy_credentials()
+                        credentials = base64.b64encode(f"{username}:{password}".encode()).decode()
+                        self.client.headers["Proxy-Authorization"] = f"Basic {credentials}"
+
+                retries = retries + 1
+            except httpx.RequestError as err:
+                debug(
+                    f"An error occurred while requesting URL: {err.request.url}, error: {err}",
+                )
+                raise err
+            except httpx.HTTPStatusError as err:
+                debug(
+                    f"An error occurred while requesting URL: {err.request.url}, error: {err.response.status_code}",
+                )
+                raise err
+
+    def backoff(self, delay: float, retries: int = 0) -> None:
+        """
+        Pause the requests of all threads sharing the session.
+
+        The pause is extended if other threads are rate limited meanwhile. Once the latest
+        requested delay has elapsed, each thread resumes after its own random jitter, so the
+        retries are not sent at the same moment.
+
+        :param delay: number of seconds to pause the requests for
+        :param retries: number of retries made so far, the jitter grows with it
+        """
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + delay)
+            self._resume.clear()
+
+        while True:
+            with self._lock:
+                remaining = self._resume_at - time.monotonic()
+
+                if remaining <= 0:
+                    self._resume.set()
+                    break
+
+            time.sleep(remaining)
+
+        self.jitter(retries)
+
+    def wait_resume(self, retries: int = 0) -> None:
+        """
+        Wait until the paused requests are resumed, then sleep for a random jitter.
+
+        :param retries: number of retries made so far, the jitter grows with it
+        """
+        if self._resume.is_set():
+            return
+
+        self._resume.wait()
+        self.jitter(retries)
+
+    def jitter(self, retries: int = 0) -> None:
+        """
+        Sleep for a random time up to 2**retries seconds, 30 seconds at most.
+
+        :param retries: number of retries made so far
+        """
+        time.sleep(random.uniform(0, min(2**retries, 30)))
 
     def normalize_url(self, url: str) -> str:
         """
@@ -171,10 +332,10 @@ class Session:
 
         :return: normalized URL
         """
-        if not urlparse(url).scheme or not url.startswith(urlparse(url).scheme):
-            url = f"{self.base_url}/{url}"
+        if url.startswith(("http://", "https://")):
+            return url
 
-        return url
+        return self.base_prefix + url
 
     def process_response(self, response: httpx.Response) -> None:
         """
@@ -182,14 +343,8 @@ class Session:
 
         :param response: HTTP response
 
-        :raises: NextPage, RateLimit if the response requires further processing
+        :raises: NextPage, RateLimit, ServiceUnavailable if the response requires further processing
         """
-        if response.cookies:
-            if "cookies" in self.params:
-                self.params["cookies"].update(response.cookies)
-            else:
-                self.params["cookies"] = response.cookies
-
         if response.status_code in (
             HTTPStatus.OK,
             HTTPStatus.CREATED,
@@ -200,7 +355,14 @@ class Session:
             return
 
         if response.status_code == HTTPStatus.TOO_MANY_REQUESTS:
-            raise RateLimit(response.url, int(response.headers.get("Retry-After", 15)))
+            raise RateLimit(response, parse_retry_after(response.headers.get("Retry-After"), 15))
+        if response.status_code in (
+            HTTPStatus.BAD_GATEWAY,
+            HTTPStatus.SERVICE_UNAVAILABLE,
+            HTTPStatus.GATEWAY_TIMEOUT,
+        ):
+            # Without a valid Retry-After the request is retried with exponential backoff
+            raise ServiceUnavailable(response, parse_retry_after(response.headers.get("Retry-After")))
         if response.status_code == HTTPStatus.PROXY_AUTHENTICATION_REQUIRED:
             raise ProxyAuthenticationRequired()
 
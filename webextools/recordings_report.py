@@ -1,14 +1,25 @@
 """This is module to generate a report of Webex Teams users who requested recording data."""
 
 import argparse
-import json
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Iterator
 
 from webexteamssdk import ApiError, WebexTeamsAPI
 
-from webextools.helper import error, generate_time_ranges, prompt_token, write_csv
+from webextools.helper import (
+    error,
+    generate_time_ranges,
+    is_verbose,
+    json_dumps,
+    prompt_token,
+    set_verbosity,
+    write_csv,
+)
 from webextools.http import Session
+from webextools.settings import SDK_MAX_WORKERS
 
 
 def get_recording_report(api: WebexTeamsAPI, _from: str, to: str):
@@ -54,50 +65,76 @@ def prepare_detailed_report_from_summary(api: WebexTeamsAPI, recording: dict):
     :param recording: The recording to prepare the detailed report for
     :return: The prepared detailed report
     """
-    report = []
-    recording_id = recording["recordingId"]
-
-    result = get_detailed_report(api, recording_id).get("items", [])
+    result = get_detailed_report(api, recording["recordingId"]).get("items", [])
 
     if not result:
         return []
 
-    for i in result:
-        report.append(
-            {
-                "recordingId": recording["recordingId"],
-                "topic": recording["topic"],
-                "timeRecorded": recording["timeRecorded"],
-                "requestorName": i.get("name", ""),
-                "requestorEmail": i.get("email", ""),
-                "accessTime": i["accessTime"],
-                "downloaded": i["downloaded"],
-                "viewed": i["viewed"],
-            }
-        )
-
-    return report
-
-
-def prepare_summary_report(api: WebexTeamsAPI, time_ranges: list) -> list:
+    base = {
+        "recordingId": recording["recordingId"],
+        "topic": recording["topic"],
+        "timeRecorded": recording["timeRecorded"],
+    }
+
+    return [
+        {
+            **base,
+            "requestorName": i.get("name", ""),
+            "requestorEmail": i.get("email", ""),
+            "accessTime": i["accessTime"],
+            "downloaded": i["downloaded"],
+            "viewed": i["viewed"],
+        }
+        for i in result
+    ]
+
+
+def prepare_summary_report(
+    api: WebexTeamsAPI, time_ranges: list, max_workers: int = SDK_MAX_WORKERS
+) -> list:
     """
-    Prepare the summary report.
+    Prepare the summary report, the time ranges are requested concurrently.
 
     :param api: The Webex Teams API object.
     :param time_ranges: The time ranges to get the report for.
+    :param max_workers: The maximum number of concurrent requests.
     :return: The prepared summary report, or an empty list if no report is found.
     """
     summary_report = []
 
-    for range in time_ranges:
-        summary_report.extend(get_recording_report(api, range[0], range[1]))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(get_recording_report, api, _from, to) for _from, to in time_ranges]
+
+        for future in futures:
+            summary_report.extend(future.result())
 
     return [] if not summary_report else summary_report
 
 
-def recording_report_main(args: argparse.Namespace):
-    detailed_report = []
+def iter_detailed_report(
+    api: WebexTeamsAPI, summary_report: list, max_workers: int = SDK_MAX_WORKERS
+) -> Iterator[dict]:
+    """
+    Get the detailed report for each recording of the summary report, the recordings are
+    requested concurrently and the rows are yielded as soon as the recording is processed.
 
+    :param api: The Webex Teams API object.
+    :param summary_report: The summary report to get the detailed report for.
+    :param max_workers: The maximum number of concurrent requests.
+    :return: Iterator of the detailed report rows.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        reports = executor.map(partial(prepare_detailed_report_from_summary, api), summary_report)
+
+        for recording, report in zip(summary_report, reports):
+            if not report:
+                print(f"No detailed report found for {recording['recordingId']}")
+                continue
+
+            yield from report
+
+
+def recording_report_main(args: argparse.Namespace):
     if args.period > 365:
         error("Invalid value for period. The maximum value for period is 365 days.")
         sys.exit(1)
@@ -114,32 +151,31 @@ def recording_report_main(args: argparse.Namespace):
         print("No recording report found.")
         sys.exit(0)
 
-    for recording in summary_report:
-        report = prepare_detailed_report_from_summary(api, recording)
+    detailed_report = iter_detailed_report(api, summary_report)
 
-        if not report:
-            print(f"No detailed report found for {recording['recordingId']}")
-            continue
-
-        detailed_report.extend(report)
+    if is_verbose():
+        # The whole report is printed at the end, keep the rows
+        detailed_report = list(detailed_report)
 
     if args.write:
         filename = write_csv(detailed_report, args.write)
 
         if filename:
             print("Report was saved to", os.path.abspath(filename))
+    else:
+        for _ in detailed_report:
+            pass
 
-    if os.getenv("VERBOSE") is not None:
-        print(json.dumps(detailed_report, indent=4))
+    if is_verbose():
+        print(json_dumps(detailed_report, indent=True))
 
 
-def parse_arguments():
+def add_arguments(parser: argparse.ArgumentParser) -> None:
     """
-    Parse the command line arguments.
+    Add the recording report arguments to the parser.
 
-    :return: The parsed arguments.
+    :param parser: The argument parser.
     """
-    parser = argparse.ArgumentParser(description="Recording audit report")
     parser.add_argument(
         "--period",
         "-p",
@@ -157,20 +193,24 @@ def parse_arguments():
 
     parser.add_argument(
         "-v",
-        "--version",
+        "--verbose",
         action="count",
         default=0,
         help="Verbose output (can be specified multiple times)",
     )
 
-    args = parser.parse_args()
 
-    if args.verbose == 1:
-        os.environ["VERBOSE"] = "1"
+def parse_arguments():
+    """
+    Parse the command line arguments.
+
+    :return: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description="Recording audit report")
+    add_arguments(parser)
 
-    if args.verbose > 1:
-        os.environ["VERBOSE"] = "1"
-        os.environ["DEBUG"] = "1"
+    args = parser.parse_args()
+    set_verbosity(args.verbose)
 
     return args
 
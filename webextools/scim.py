@@ -1,8 +1,9 @@
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 
-from webextools.helper import error
+from webextools.helper import error, json_loads
 from webextools.http import Session
-from webextools.settings import DEFAULT_IDENTITY_URL
+from webextools.settings import DEFAULT_IDENTITY_URL, SCIM_BULK_TIMEOUT, SCIM_USERS_PAGE_SIZE
 from webextools.users import User
 
 
@@ -14,54 +15,71 @@ class SCIM:
         )
         self.org_id = org_id
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self) -> None:
+        """Close the SCIM API session."""
+        self.session.close()
+
     def get_users(self, org_id: str = "", filter: str = ""):
         """
         Get all users in an organization.
 
         :param org_id: Organization ID
+        :param filter: SCIM filter expression
         :return: Generator of User objects
         """
-        total_results = 0
-        next_index = 1
-        items_per_page = 0
-
         org_id = org_id or self.org_id
 
         if not org_id:
             error("SCIM [get_users] - Organization ID is required")
+            return
 
         url = f"scim/{org_id}/v2/Users"
+        params = {"startIndex": 1, "count": SCIM_USERS_PAGE_SIZE}
 
         if filter:
-            url += f"?filter={filter}"
+            params["filter"] = filter
 
-        while True:
-            params = {"startIndex": next_index}
+        data = self.get_users_page(url, params)
+        executor = None
 
-            if items_per_page:
-                params["count"] = items_per_page
-
-            response = self.session.get(
-                url,
-            )
+        try:
+            while data:
+                future = None
+                items_per_page = data.get("itemsPerPage", 0)
+                next_index = data.get("startIndex", 1) + items_per_page
 
-            for item in response:
-                data = item.json()
+                # The next page is requested in the background while the current page is consumed
+                if items_per_page and next_index <= data.get("totalResults", 0):
+                    executor = executor or ThreadPoolExecutor(max_workers=1)
+                    params = {**params, "startIndex": next_index}
+                    future = executor.submit(self.get_users_page, url, params)
 
-                if not total_results:
-                    total_results = data.get("totalResults", 0)
+                for resource in data.get("Resources") or []:
+                    yield User(resource)
 
-                items_per_page = data.get("itemsPerPage", 0)
-                next_index = data.get("startIndex", 1) + items_per_page
+                data = future.result() if future is not None else None
+        finally:
+            if executor is not None:
+                executor.shutdown()
 
-                resources = data.get("Resources")
+    def get_users_page(self, url: str, params: dict) -> dict:
+        """
+        Get a single page of users.
 
-                if resources:
-                    for resource in resources:
-                        yield User(resource)
+        :param url: SCIM users URL
+        :param params: SCIM query parameters
+        :return: SCIM list response, empty if no response was received
+        """
+        # SCIM pages are requested by startIndex, Link pagination is not followed
+        response = next(iter(self.session.get(url, params=params)), None)
 
-            if next_index - 1 >= total_results:
-                break
+        return json_loads(response.content) if response is not None else {}
 
     def get_user(self, user_id: str, org_id: str = "") -> Optional[User]:
         """
@@ -89,7 +107,7 @@ class SCIM:
         if not response:
             return None
 
-        return User(response[0].json())
+        return User(json_loads(response[0].content))
 
     def update_user_patch(self, user_id: str, data: dict, org_id: str = "") -> Optional[User]:
         """
@@ -121,4 +139,40 @@ class SCIM:
         if not response:
             return None
 
-        return User(response[0].json())
+        return User(json_loads(response[0].content))
+
+    def bulk_request(self, operations: list[dict], org_id: str = "") -> list[dict]:
+        """
+        Run multiple operations in a single SCIM Bulk request
+
+        :param operations: list of bulk operations
+        :param org_id: Organization ID
+
+        :return: list of bulk operation results
+        """
+        org_id = org_id or self.org_id
+
+        if not org_id:
+            raise ValueError("Organization ID is required")
+
+        url = f"scim/{org_id}/v2/Bulk"
+
+        response = self.session.post(
+            url,
+            json={
+                "schemas": ["urn:ietf:params:scim:api:messages:2.0:BulkRequest"],
+                "Operations": operations,
+            },
+            # Up to SCIM_BULK_MAX_OPERATIONS users are updated by a single request
+            timeout=SCIM_BULK_TIMEOUT,
+        )
+
+        if not response:
+            return []
+
+        response = list(response)
+
+        if not response:
+            return []
+
+        return json_loads(response[0].content).get("Operations", [])
@@ -5,3 +5,10 @@ RESOURCE_URIS = {
     "pmr": "meetingPreferences/personalMeetingRoom",
     "reports": "reports",
 }
+DEFAULT_MAX_WORKERS = 16
+# The requests session of the Webex Teams SDK keeps at most 10 connections
+SDK_MAX_WORKERS = 10
+SCIM_FILTER_BATCH_SIZE = 20
+SCIM_BULK_MAX_OPERATIONS = 100
+SCIM_BULK_TIMEOUT = 60
+SCIM_USERS_PAGE_SIZE = 1000
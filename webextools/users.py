@@ -1,35 +1,54 @@
-from dataclasses import InitVar, dataclass, field
+class User:
+    """SCIM user, the fields are read from the SCIM user data on access."""
 
+    __slots__ = ("_data",)
 
-@dataclass
-class User:
-    data: InitVar[dict]
-    id: str = ""
-    user_name: str = ""
-    emails: list = field(default_factory=list)
-    display_name: str = ""
-    nick_name: str = ""
-    first_name: str = ""
-    last_name: str = ""
-    roles: list = field(default_factory=list)
-    timezone: str = ""
-    active: bool = False
-    type: str = ""
-
-    def __post_init__(self, data):
-        if isinstance(data, dict):
-            self._data = data
-        else:
-            return None
-
-        self.id = self._data.get("id", "")
-        self.user_name = self._data.get("userName", "")
-        self.emails = self._data.get("emails", [])
-        self.display_name = self._data.get("displayName", "")
-        self.nick_name = self._data.get("nickName", "")
-        self.first_name = self._data.get("name", {}).get("givenName", "")
-        self.last_name = self._data.get("name", {}).get("familyName", "")
-        self.roles = self._data.get("roles", [])
-        self.timezone = self._data.get("timezone", "")
-        self.active = self._data.get("active", False)
-        self.type = self._data.get("userType", "")
+    def __init__(self, data: dict):
+        self._data = data if isinstance(data, dict) else {}
+
+    def __repr__(self) -> str:
+        return f"User(id={self.id!r}, user_name={self.user_name!r}, active={self.active!r})"
+
+    @property
+    def id(self) -> str:
+        return self._data.get("id", "")
+
+    @property
+    def user_name(self) -> str:
+        return self._data.get("userName", "")
+
+    @property
+    def emails(self) -> list:
+        return self._data.get("emails", [])
+
+    @property
+    def display_name(self) -> str:
+        return self._data.get("displayName", "")
+
+    @property
+    def nick_name(self) -> str:
+        return self._data.get("nickName", "")
+
+    @property
+    def first_name(self) -> str:
+        return self._data.get("name", {}).get("givenName", "")
+
+    @property
+    def last_name(self) -> str:
+        return self._data.get("name", {}).get("familyName", "")
+
+    @property
+    def roles(self) -> list:
+        return self._data.get("roles", [])
+
+    @property
+    def timezone(self) -> str:
+        return self._data.get("timezone", "")
+
+    @property
+    def active(self) -> bool:
+        return self._data.get("active", False)
+
+    @property
+    def type(self) -> str:
+        return self._data.get("userType", "")